@@ -1 +1,2 @@
-from .main import memoize
\ No newline at end of file
+from .main import memoize
+from .snapshot import export_snapshot, import_snapshot
@@ -0,0 +1,263 @@
+"""
+Inspect and maintain a memoize cache directory from the command line:
+
+    python -m memoize report --cache-dir /tmp/memoize
+    python -m memoize compact --cache-dir /tmp/memoize
+    python -m memoize convert csv parquet --cache-dir /tmp/memoize
+    python -m memoize gc --lifetime 7 --cache-dir /tmp/memoize
+
+Every command processes one cache file at a time, so that caches larger than
+RAM can be maintained.
+"""
+import os
+import re
+import json
+import uuid
+import sqlite3
+import argparse
+from pathlib import Path
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional
+from .main import _read_cache
+from .utils import _get_hist_fps, _write_dict_to_file
+
+# `memoize` writes {funcname}_{stub}.json, where funcname may be suffixed with
+# -{version}. `memoize_df` writes {funcname}_{key}_{stub}.{ext}.
+_DF_RE = re.compile(r"(?P<func>.+)_(?P<key>[0-9a-f]{7})_(?P<stub>[^_]+)\.(?P<ext>csv|parquet)")
+_JSON_RE = re.compile(r"(?P<func>.+)_(?P<stub>[^_]+)\.(?P<ext>json)")
+
+# Supported target formats of `convert` for each cache file format
+_CONVERSIONS = {
+    'json': ['jsonl', 'sqlite'],
+    'csv': ['parquet', 'arrow'],
+    'parquet': ['csv', 'arrow'],
+}
+
+
+def _parse_stub_date(stub: str) -> Optional[date]:
+    try:
+        return datetime.strptime(stub, '%Y%m%d').date()
+    except ValueError:
+        return None
+
+
+def _scan_cache(cache_dir: Path) -> Iterator[Dict]:
+    """Yield a description of each cache file in `cache_dir`."""
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            match = re.fullmatch(_DF_RE, entry.name) or re.fullmatch(_JSON_RE, entry.name)
+            if not match:
+                continue
+            item = match.groupdict()
+            item['fp'] = Path(entry.path)
+            item['dt'] = _parse_stub_date(item['stub'])
+            item['size'] = entry.stat().st_size
+            item['mtime'] = datetime.fromtimestamp(entry.stat().st_mtime).date()
+            yield item
+
+
+def report(cache_dir: Path, as_json: bool = False):
+    """Print entry count, size and age of cache files per function."""
+    funcs: Dict[str, Dict] = dict()
+    for item in _scan_cache(cache_dir):
+        stats = funcs.setdefault(item['func'], {
+            'files': 0, 'entries': 0, 'bytes': 0, 'oldest': None, 'newest': None,
+        })
+        stats['files'] += 1
+        stats['bytes'] += item['size']
+        if item['ext'] == 'json':
+            stats['entries'] += len(_read_cache(str(item['fp'])))
+        else:
+            stats['entries'] += 1
+        dt = item['dt'] or item['mtime']
+        if stats['oldest'] is None or dt < stats['oldest']:
+            stats['oldest'] = dt
+        if stats['newest'] is None or dt > stats['newest']:
+            stats['newest'] = dt
+
+    today = date.today()
+    rows = [
+        {
+            'func': func,
+            'files': stats['files'],
+            'entries': stats['entries'],
+            'bytes': stats['bytes'],
+            'oldest_days': (today - stats['oldest']).days,
+            'newest_days': (today - stats['newest']).days,
+        }
+        for func, stats in sorted(funcs.items())
+    ]
+    if as_json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'function':<40} {'files':>7} {'entries':>9} {'bytes':>12} {'oldest':>7} {'newest':>7}")
+    for row in rows:
+        print(
+            f"{row['func']:<40} {row['files']:>7} {row['entries']:>9} {row['bytes']:>12} "
+            f"{row['oldest_days']:>6}d {row['newest_days']:>6}d"
+        )
+
+
+def compact(cache_dir: Path, lifetime: Optional[int] = None, dry_run: bool = False):
+    """
+    Merge the dated day-files of each `memoize` function into its oldest
+    day-file and delete the newer day-files. Merging into the oldest day-file
+    never makes an entry look newer than it is, so expired entries stay
+    expired. If `lifetime` is specified, only merge day-files up to `lifetime`
+    days old and leave older ones to `gc`.
+    """
+    funcs = {
+        item['func'] for item in _scan_cache(cache_dir)
+        if item['ext'] == 'json' and item['dt'] is not None
+    }
+    for func in sorted(funcs):
+        hist_fps: List[Path] = _get_hist_fps(cache_dir, f"{func}_*.json", lifetime)
+        if len(hist_fps) < 2:
+            continue
+        cache = dict()
+        # Merge from least to most recent so that newer entries win
+        for hist_fp in reversed(hist_fps):
+            cache.update(_read_cache(str(hist_fp)))
+        print(f"Merging {len(hist_fps)} files of function {func} into {hist_fps[-1]}")
+        if dry_run:
+            continue
+        _write_dict_to_file(str(hist_fps[-1]), cache)
+        for hist_fp in hist_fps[:-1]:
+            hist_fp.unlink()
+
+
+def convert(cache_dir: Path, src: str, dst: str, output: Optional[Path] = None, dry_run: bool = False):
+    """
+    Convert cache files from format `src` to `dst`. DataFrame cache files are
+    converted in place. JSON cache files are exported to `output`, which is a
+    directory for jsonl and a database file for sqlite.
+    """
+    if dst not in _CONVERSIONS.get(src, []):
+        raise Exception(f"Unsupported conversion {src=} {dst=}")
+    if src == 'json' and output is None:
+        raise Exception(f"Converting json cache files to {dst} requires --output")
+
+    items = [item for item in _scan_cache(cache_dir) if item['ext'] == src]
+    if src == 'json':
+        if dst == 'jsonl':
+            _convert_json_to_jsonl(items, output, dry_run)
+        else:
+            _convert_json_to_sqlite(items, output, dry_run)
+        return
+
+    from .dataframe import _read, _write
+    for item in items:
+        target = item['fp'].with_suffix(f".{dst}")
+        print(f"Converting {item['fp']} to {target}")
+        if dry_run:
+            continue
+        df = _read(src, str(item['fp']))
+        # Cache files may share an inode with a blob, so never write in place.
+        # Only delete the source once the target has been written.
+        tmp_fp = cache_dir / f".{uuid.uuid4().hex}.tmp"
+        try:
+            if dst == 'arrow':
+                df.to_feather(str(tmp_fp))
+            else:
+                _write(dst, str(tmp_fp), df)
+            os.replace(tmp_fp, target)
+        finally:
+            if tmp_fp.exists():
+                tmp_fp.unlink()
+        item['fp'].unlink()
+
+
+def _convert_json_to_jsonl(items: List[Dict], output: Path, dry_run: bool = False):
+    if not dry_run:
+        output.mkdir(parents=True, exist_ok=True)
+    for item in items:
+        target = output / item['fp'].with_suffix('.jsonl').name
+        print(f"Converting {item['fp']} to {target}")
+        if dry_run:
+            continue
+        with open(target, 'w') as f:
+            for key, value in _read_cache(str(item['fp'])).items():
+                f.write(json.dumps({'key': key, 'value': value}) + '\n')
+
+
+def _convert_json_to_sqlite(items: List[Dict], output: Path, dry_run: bool = False):
+    print(f"Converting {len(items)} files to {output}")
+    if dry_run:
+        return
+    con = sqlite3.connect(str(output))
+    try:
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(func TEXT, stub TEXT, key TEXT, value TEXT, PRIMARY KEY (func, stub, key))"
+        )
+        for item in items:
+            cache = _read_cache(str(item['fp']))
+            con.executemany(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                ((item['func'], item['stub'], key, json.dumps(value)) for key, value in cache.items())
+            )
+            con.commit()
+    finally:
+        con.close()
+
+
+def gc(cache_dir: Path, lifetime: int, dry_run: bool = False):
+    """Delete dated cache files more than `lifetime` days old."""
+    today = date.today()
+    count = 0
+    for item in _scan_cache(cache_dir):
+        if item['dt'] is None or (today - item['dt']).days <= lifetime:
+            continue
+        print(f"Deleting {item['fp']}")
+        count += 1
+        if not dry_run:
+            item['fp'].unlink()
+    print(f"Deleted {count} cache files")
+    if not dry_run and (cache_dir / 'blobs').is_dir():
+        from .dataframe import sweep_blobs
+        sweep_blobs(str(cache_dir))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='python -m memoize', description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--cache-dir', default='/tmp/memoize', help="cache directory (default: %(default)s)")
+    parser.add_argument('--dry-run', action='store_true', help="print what would change without changing it")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    report_parser = subparsers.add_parser('report', help="report entry counts, sizes and age per function")
+    report_parser.add_argument('--json', action='store_true', help="print report as JSON")
+
+    compact_parser = subparsers.add_parser('compact', help="merge day-files of each memoize function")
+    compact_parser.add_argument('--lifetime', type=int, help="only merge day-files up to this many days old")
+
+    convert_parser = subparsers.add_parser('convert', help="convert cache files between formats")
+    convert_parser.add_argument('src', choices=list(_CONVERSIONS))
+    convert_parser.add_argument('dst', choices=['jsonl', 'sqlite', 'csv', 'parquet', 'arrow'])
+    convert_parser.add_argument('--output', type=Path, help="output directory (jsonl) or database file (sqlite)")
+
+    gc_parser = subparsers.add_parser('gc', help="delete cache files past a lifetime")
+    gc_parser.add_argument('--lifetime', type=int, required=True, help="maximum age in days")
+
+    args = parser.parse_args(argv)
+    cache_dir = Path(args.cache_dir)
+    if not cache_dir.is_dir():
+        parser.error(f"{cache_dir} is not a directory")
+
+    if args.command == 'report':
+        report(cache_dir, as_json=args.json)
+    elif args.command == 'compact':
+        compact(cache_dir, lifetime=args.lifetime, dry_run=args.dry_run)
+    elif args.command == 'convert':
+        if args.dst not in _CONVERSIONS[args.src]:
+            parser.error(
+                f"cannot convert {args.src} cache files to {args.dst}; "
+                f"choose one of {', '.join(_CONVERSIONS[args.src])}"
+            )
+        if args.src == 'json' and args.output is None:
+            parser.error(f"converting json cache files to {args.dst} requires --output")
+        convert(cache_dir, args.src, args.dst, output=args.output, dry_run=args.dry_run)
+    elif args.command == 'gc':
+        gc(cache_dir, args.lifetime, dry_run=args.dry_run)
+    return 0
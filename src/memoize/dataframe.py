@@ -1,7 +1,14 @@
 import os
+import re
+import shutil
+import asyncio
+import hashlib
+import time
+import uuid
 from pathlib import Path
-from datetime import date
-from typing import List, Optional, Callable
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Tuple, Iterable, Optional, Callable
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 try:
     import pandas as pd
@@ -12,7 +19,11 @@ except ImportError:
         f'pip install --install-option="--extras-require=dataframe" git+https://github.com/ethho/memoize.git'
     )
 
-from .utils import _clean_func_name, _get_hist_fps, _make_key, _create_cache_dir, _use_async
+from .utils import (
+    _clean_func_name, _get_hist_fps, _make_key, _create_cache_dir, _use_async,
+    _func_version, _rename_namespace, _delete_other_versions,
+)
+from .profiler import _get_profile_rate, _start_timer
 
 def _read(ext: str, fp: str) -> pd.DataFrame:
     """Reads DataFrame from CSV file at `fp`."""
@@ -37,75 +48,291 @@ def _write(ext: str, fp: str, df: pd.DataFrame):
         raise Exception(f"Unsupported file extension {ext=}")
 
 
+# Number of times to write a blob that is swept before it can be linked
+_BLOB_WRITE_ATTEMPTS = 3
+
+
+def _hash_file(fp: Path, chunk_size: int = 1 << 20) -> str:
+    """Return SHA-256 hash of the contents of file at `fp`."""
+    hl = hashlib.new('sha256')
+    with open(fp, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hl.update(chunk)
+    return hl.hexdigest()
+
+
+def _link_or_copy(src: Path, dst: Path):
+    """Hardlink `src` to `dst`, falling back to a copy if hardlinks are unsupported."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _write_cache(ext: str, cache_dir: str, fp: Path, df: pd.DataFrame, dedupe: bool = False):
+    """
+    Write `df` to cache file `fp`. If `dedupe` is set, write `df` to the
+    content-addressed blob store `{cache_dir}/blobs` and hardlink `fp` to
+    the blob, so that identical results are stored once.
+    """
+    # Cache files may share an inode with a blob, so never write in place:
+    # write or link a temporary file and replace `fp` with it. This also
+    # handles concurrent calls for the same key.
+    tmp_fp = Path(cache_dir) / f".{uuid.uuid4().hex}.{ext}"
+    try:
+        if dedupe and _link_blob(ext, cache_dir, tmp_fp, df):
+            os.replace(tmp_fp, fp)
+            return
+        _write(ext, str(tmp_fp), df)
+        os.replace(tmp_fp, fp)
+    finally:
+        if tmp_fp.exists():
+            tmp_fp.unlink()
+
+
+def _link_blob(ext: str, cache_dir: str, fp: Path, df: pd.DataFrame) -> bool:
+    """
+    Write `df` to the blob store and hardlink the new path `fp` to the blob.
+    Returns False if hardlinks are unsupported.
+    """
+    blob_dir = Path(cache_dir) / 'blobs'
+    blob_dir.mkdir(exist_ok=True)
+    for _ in range(_BLOB_WRITE_ATTEMPTS):
+        tmp_fp = blob_dir / f".{uuid.uuid4().hex}.{ext}"
+        _write(ext, str(tmp_fp), df)
+        blob_fp = blob_dir / f"{_hash_file(tmp_fp)}.{ext}"
+        try:
+            if not blob_fp.exists():
+                os.replace(tmp_fp, blob_fp)
+            else:
+                tmp_fp.unlink()
+                # Refresh mtime so that sweep_blobs spares the blob until it is linked
+                os.utime(blob_fp)
+            os.link(blob_fp, fp)
+            return True
+        except FileNotFoundError:
+            # Blob was swept before it was linked, so write it again
+            continue
+        except OSError:
+            # Hardlinks are unsupported. Leave the blob to sweep_blobs, since
+            # another call may have linked it in the meantime.
+            return False
+    return False
+
+
+def sweep_blobs(
+    cache_dir: Optional[str] = '/tmp/memoize',
+    log_func: Callable = print,
+    grace_seconds: float = 60,
+) -> int:
+    """
+    Delete blobs in `{cache_dir}/blobs` that are no longer hardlinked from any
+    cache file. Blobs modified in the last `grace_seconds` seconds are kept,
+    since a concurrent call may not have linked them yet. Returns the number
+    of deleted blobs.
+    """
+    blob_dir = Path(cache_dir) / 'blobs'
+    if not blob_dir.is_dir():
+        return 0
+    count = 0
+    for blob_fp in blob_dir.iterdir():
+        if blob_fp.name.startswith('.'):
+            # Skip blobs that are still being written
+            continue
+        try:
+            stat = blob_fp.stat()
+            if stat.st_nlink <= 1 and time.time() - stat.st_mtime > grace_seconds:
+                blob_fp.unlink()
+                count += 1
+        except FileNotFoundError:
+            # Deleted by a concurrent sweep
+            continue
+    log_func(f"Deleted {count} unreferenced blobs from {blob_dir}")
+    return count
+
+
 def memoize_df(
     stub: Optional[str] = None,
     cache_dir: Optional[str] = '/tmp/memoize',
     ext: str = 'csv',
     log_func: Callable = print,
-    cache_lifetime_days: int = 0
+    cache_lifetime_days: int = 0,
+    versioned: bool = False,
+    depends_on: Optional[List[Callable]] = None,
+    dedupe: bool = False,
+    profile: Optional[float] = None,
 ) -> Callable:
     """
     Cache the DataFrame returned by this function to
     `{cache_dir}/{funcname}_{stub}.{ext}`.
     Read cache entries up to `cache_lifetime_days` days ago if specified; setting
     to None will read from the most recent cache entry.
+    If `dedupe` is set, identical DataFrames are stored once in a content-addressed
+    blob store under `{cache_dir}/blobs`, and each cache file is a hardlink to its
+    blob. Use `sweep_blobs` to delete blobs that are no longer referenced.
+    If `versioned` is set, the function name in the cache file name is suffixed
+    with `-{version}`, a hash of the source code of this function and of the
+    functions in `depends_on`, so that changing the code invalidates the cache.
+    Time the stages of a fraction `profile` of calls; see `memoize.profiler`.
+    Defaults to the $MEMOIZE_PROFILE environment variable.
     """
     # Ensure that cache exists
     _create_cache_dir(cache_dir)
     stub = stub if stub else date.today().strftime('%Y%m%d')
+    profile_rate = _get_profile_rate(profile, log_func)
 
     def add_memoize_dec(func):
-        funcname = _clean_func_name(func.__name__)
+        basename = _clean_func_name(func.__name__)
+        version = _func_version(func, depends_on) if versioned else None
+        funcname = f"{basename}-{version}" if versioned else basename
 
         if not _use_async(func, log_func):
             @wraps(func)
             def memoize_dec(*args, **kwargs):
+                timer = _start_timer(funcname, profile_rate)
                 key = _make_key(func.__name__, args, kwargs, maxlen=7)
+                timer.lap('make_key')
                 fp = Path(cache_dir) / f"{funcname}_{key}_{stub}.{ext}"
                 log_func(f"Using cache {fp=} to write results of function {funcname}")
                 fp_pattern = f"{funcname}_{key}_*.{ext}"
                 if not kwargs.get('_memoize_force_refresh'):
                     hist_fps: List[Path] = _get_hist_fps(Path(cache_dir), fp_pattern, cache_lifetime_days)
+                    timer.lap('get_hist_fps')
                     for hist_fp in hist_fps:
                         log_func(f"Using cached call from {hist_fp}")
-                        return _read(ext, str(hist_fp))
+                        result = _read(ext, str(hist_fp))
+                        timer.lap('read')
+                        timer.finish(hit=True)
+                        return result
 
                 # Else run the function and store cached result
                 result = func(*args, **kwargs)
+                timer.lap('func')
 
                 if not isinstance(result, pd.DataFrame):
                     raise Exception(
                         f"Failed to write return value of function '{funcname}' to CSV file. "
                         f"Expected a pandas.DataFrame, received {type(result)}."
                     )
-                _write(ext, str(fp), result)
+                _write_cache(ext, cache_dir, fp, result, dedupe)
+                timer.lap('write')
+                timer.finish(hit=False)
                 return result
-            return memoize_dec
+            wrapper = memoize_dec
         else:
             # Same function as memoize_dec except for the await
 
             @wraps(func)
             async def async_memoize_dec(*args, **kwargs):
+                timer = _start_timer(funcname, profile_rate)
                 key = _make_key(func.__name__, args, kwargs, maxlen=7)
+                timer.lap('make_key')
                 fp = Path(cache_dir) / f"{funcname}_{key}_{stub}.{ext}"
                 log_func(f"Using cache {fp=} to write results of function {funcname}")
                 fp_pattern = f"{funcname}_{key}_*.{ext}"
                 if not kwargs.get('_memoize_force_refresh'):
                     hist_fps: List[Path] = _get_hist_fps(Path(cache_dir), fp_pattern, cache_lifetime_days)
+                    timer.lap('get_hist_fps')
                     for hist_fp in hist_fps:
                         log_func(f"Using cached call from {hist_fp}")
-                        return _read(ext, str(hist_fp))
+                        result = _read(ext, str(hist_fp))
+                        timer.lap('read')
+                        timer.finish(hit=True)
+                        return result
 
                 # Else run the function and store cached result
                 result = await func(*args, **kwargs)
+                timer.lap('func')
 
                 if not isinstance(result, pd.DataFrame):
                     raise Exception(
                         f"Failed to write return value of function '{funcname}' to CSV file. "
                         f"Expected a pandas.DataFrame, received {type(result)}."
                     )
-                _write(ext, str(fp), result)
+                _write_cache(ext, cache_dir, fp, result, dedupe)
+                timer.lap('write')
+                timer.finish(hit=False)
                 return result
-            return async_memoize_dec
+            wrapper = async_memoize_dec
+
+        def preload(stubs: Optional[List[str]] = None):
+            """
+            Copy the most recent cache file of each call in `stubs` to today's
+            stub, so that the first calls after a stub rollover are cache hits.
+            By default, considers the dated cache files of this function that are
+            no more than `cache_lifetime_days` days old, so that expired entries
+            stay expired.
+            """
+            re_query = re.compile(rf"{re.escape(funcname)}_([0-9a-f]{{7}})_(.+)\.{re.escape(ext)}")
+            latest = dict()
+            for hist_fp in Path(cache_dir).glob(f"{funcname}_*.{ext}"):
+                match = re.fullmatch(re_query, hist_fp.name)
+                if not match:
+                    continue
+                key, hist_stub = match.groups()
+                if stubs is None:
+                    try:
+                        hist_dt = datetime.strptime(hist_stub, '%Y%m%d').date()
+                    except ValueError:
+                        continue
+                    if (cache_lifetime_days is not None and cache_lifetime_days >= 0
+                            and date.today() - hist_dt > timedelta(days=cache_lifetime_days)):
+                        continue
+                elif hist_stub not in stubs:
+                    continue
+                if hist_stub > latest.get(key, ('', None))[0]:
+                    latest[key] = (hist_stub, hist_fp)
+            count = 0
+            for key, (_, hist_fp) in latest.items():
+                fp = Path(cache_dir) / f"{funcname}_{key}_{stub}.{ext}"
+                if not fp.exists():
+                    _link_or_copy(hist_fp, fp)
+                    count += 1
+            log_func(f"Preloaded {count} cache files for function {funcname}")
+
+        if not _use_async(func, log_func):
+            def warm(arg_sets: Iterable[Tuple[Tuple, Dict]], max_workers: Optional[int] = None):
+                """
+                Call this function for each `(args, kwargs)` pair in `arg_sets`
+                in parallel, computing and caching any uncached results.
+                """
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    futures = [executor.submit(wrapper, *args, **kwargs) for args, kwargs in arg_sets]
+                    for future in futures:
+                        future.result()
+        else:
+            async def warm(arg_sets: Iterable[Tuple[Tuple, Dict]]):
+                """
+                Call this function for each `(args, kwargs)` pair in `arg_sets`
+                concurrently, computing and caching any uncached results.
+                """
+                await asyncio.gather(*(wrapper(*args, **kwargs) for args, kwargs in arg_sets))
+
+        # Matches the part of a cache file name after the function name
+        suffix = rf"[0-9a-f]{{7}}_(?:\d{{8}}|{re.escape(stub)})\.{re.escape(ext)}"
+
+        def migrate(from_version: Optional[str] = None) -> int:
+            """
+            Rename cache files written by version `from_version` of this function
+            to the current version, keeping its cached results after a change that
+            does not affect them. By default, migrates unversioned cache files.
+            """
+            if not versioned:
+                raise Exception(f"Cannot migrate cache of unversioned function '{basename}'")
+            src = f"{basename}-{from_version}" if from_version else basename
+            return _rename_namespace(Path(cache_dir), src, funcname, suffix, log_func)
+
+        def retain() -> int:
+            """Delete cache files written by other versions of this function."""
+            if not versioned:
+                raise Exception(f"Cannot retain cache of unversioned function '{basename}'")
+            return _delete_other_versions(Path(cache_dir), basename, version, suffix, log_func)
+
+        wrapper.version = version
+        wrapper.migrate = migrate
+        wrapper.retain = retain
+        wrapper.preload = preload
+        wrapper.warm = warm
+        return wrapper
     return add_memoize_dec
 
@@ -1,10 +1,17 @@
 import os
+import re
 import json
+import asyncio
 from pathlib import Path
 from datetime import date
-from typing import List, Optional, Callable
+from typing import List, Dict, Tuple, Iterable, Optional, Callable
 from functools import wraps
-from .utils import _clean_func_name, _get_hist_fps, _make_key, _create_cache_dir, _write_dict_to_file, _use_async
+from concurrent.futures import Future, ThreadPoolExecutor
+from .profiler import _get_profile_rate, _start_timer
+from .utils import (
+    _clean_func_name, _get_hist_fps, _make_key, _create_cache_dir, _write_dict_to_file, _use_async,
+    _get_process_pool, _call_by_qualname, _func_version, _rename_namespace, _delete_other_versions,
+)
 
 def _read_cache(fp: str, ignore_invalid: bool = True):
     cache = dict()
@@ -21,77 +28,286 @@ def _read_cache(fp: str, ignore_invalid: bool = True):
     return cache
 
 
+def _merge_cache_files(src: Path, dst: Path):
+    """Merge the cache at `src` into the cache at `dst`, keeping entries of `dst`."""
+    cache = _read_cache(str(src))
+    cache.update(_read_cache(str(dst)))
+    _write_dict_to_file(str(dst), cache)
+
+
 def memoize(
     stub: Optional[str] = None,
     cache_dir: Optional[str] = '/tmp/memoize',
     ext: str = 'json',
     log_func: Callable = print,
-    cache_lifetime_days: int = 0
+    cache_lifetime_days: int = 0,
+    versioned: bool = False,
+    depends_on: Optional[List[Callable]] = None,
+    use_process_pool: bool = False,
+    profile: Optional[float] = None,
 ) -> Callable:
     """
     Cache results of this function to the file `{cache_dir}/{funcname}_{stub}.{ext}`.
     Read cache entries up to `cache_lifetime_days` days ago if specified; setting
     to None will read from the most recent cache entry.
+    If `use_process_pool` is set, the decorated function returns a
+    `concurrent.futures.Future`: cache hits resolve immediately, while misses are
+    computed in a process pool shared by all decorated functions. Wrap the future
+    with `asyncio.wrap_future` to await it from a coroutine.
+    If `versioned` is set, cache to `{cache_dir}/{funcname}-{version}_{stub}.{ext}`,
+    where `version` is a hash of the source code of this function and of the
+    functions in `depends_on`, so that changing the code invalidates the cache.
+    Time the stages of a fraction `profile` of calls; see `memoize.profiler`.
+    Defaults to the $MEMOIZE_PROFILE environment variable.
     """
     # Ensure that cache exists
     _create_cache_dir(cache_dir)
     stub = stub if stub else date.today().strftime('%Y%m%d')
+    profile_rate = _get_profile_rate(profile, log_func)
 
     def add_memoize_dec(func):
-        funcname = _clean_func_name(func.__name__)
+        basename = _clean_func_name(func.__name__)
+        version = _func_version(func, depends_on) if versioned else None
+        funcname = f"{basename}-{version}" if versioned else basename
         fp = Path(cache_dir) / f"{funcname}_{stub}.{ext}"
         fp_pattern = f"{funcname}_*.{ext}"
         log_func(f"Using cache {fp=} to write results of function {funcname}")
 
-        if not _use_async(func, log_func):
+        if use_process_pool:
+            if _use_async(func, log_func):
+                raise Exception(
+                    f"Cannot use process pool with coroutine function '{funcname}'"
+                )
+            if '<locals>' in func.__qualname__:
+                raise Exception(
+                    f"Cannot use process pool with function '{funcname}': "
+                    f"function must be importable from module {func.__module__}"
+                )
+
+            @wraps(func)
+            def pool_memoize_dec(*args, **kwargs):
+                timer = _start_timer(funcname, profile_rate)
+                cache = dict()
+                key = _make_key(func.__name__, args, kwargs)
+                timer.lap('make_key')
+                future = Future()
+                # Check for a cached result
+                if not kwargs.get('_memoize_force_refresh'):
+                    hist_fps: List[Path] = _get_hist_fps(Path(cache_dir), fp_pattern, cache_lifetime_days)
+                    timer.lap('get_hist_fps')
+                    for hist_fp in hist_fps:
+                        cache.update(_read_cache(str(hist_fp)))
+                        timer.lap('read')
+                        if key in cache:
+                            log_func(f"Using cached call from {hist_fp} with {key=}")
+                            if hist_fp != fp:
+                                # Copy the entire cache from historical entry
+                                # to today if necessary
+                                _write_dict_to_file(str(fp), cache)
+                            timer.lap('write')
+                            timer.finish(hit=True)
+                            future.set_result(cache[key])
+                            return future
+
+                # Else run the function in the pool and store cached result
+                # before resolving the returned future
+                def _store_result(pool_future):
+                    try:
+                        result = pool_future.result()
+                        # Includes time spent queued for a pool worker
+                        timer.lap('func')
+                        if fp.exists():
+                            # Keep entries written while the call was running
+                            cache.update(_read_cache(str(fp)))
+                        cache[key] = result
+                        _write_dict_to_file(str(fp), cache)
+                        timer.lap('write')
+                        timer.finish(hit=False)
+                    except BaseException as err:
+                        future.set_exception(err)
+                    else:
+                        future.set_result(result)
+
+                pool_future = _get_process_pool().submit(
+                    _call_by_qualname, func.__module__, func.__qualname__, args, kwargs
+                )
+                pool_future.add_done_callback(_store_result)
+                return future
+            wrapper = pool_memoize_dec
+        elif not _use_async(func, log_func):
             @wraps(func)
             def memoize_dec(*args, **kwargs):
+                timer = _start_timer(funcname, profile_rate)
                 cache = dict()
                 key = _make_key(func.__name__, args, kwargs)
+                timer.lap('make_key')
                 # Check for a cached result
                 if not kwargs.get('_memoize_force_refresh'):
                     hist_fps: List[Path] = _get_hist_fps(Path(cache_dir), fp_pattern, cache_lifetime_days)
+                    timer.lap('get_hist_fps')
                     for hist_fp in hist_fps:
                         cache.update(_read_cache(str(hist_fp)))
+                        timer.lap('read')
                         if key in cache:
                             log_func(f"Using cached call from {hist_fp} with {key=}")
                             if hist_fp != fp:
                                 # Copy the entire cache from historical entry
                                 # to today if necessary
                                 _write_dict_to_file(str(fp), cache)
+                            timer.lap('write')
+                            timer.finish(hit=True)
                             return cache[key]
 
                 # Else run the function and store cached result
                 result = func(*args, **kwargs)
+                timer.lap('func')
                 cache[key] = result
                 _write_dict_to_file(str(fp), cache)
+                timer.lap('write')
+                timer.finish(hit=False)
                 return result
-            return memoize_dec
+            wrapper = memoize_dec
         else:
             # Same function as memoize_dec except for the await
 
             @wraps(func)
             async def async_memoize_dec(*args, **kwargs):
+                timer = _start_timer(funcname, profile_rate)
                 cache = dict()
                 key = _make_key(func.__name__, args, kwargs)
+                timer.lap('make_key')
                 # Check for a cached result
                 if not kwargs.get('_memoize_force_refresh'):
                     hist_fps: List[Path] = _get_hist_fps(Path(cache_dir), fp_pattern, cache_lifetime_days)
+                    timer.lap('get_hist_fps')
                     for hist_fp in hist_fps:
                         cache.update(_read_cache(str(hist_fp)))
+                        timer.lap('read')
                         if key in cache:
                             log_func(f"Using cached call from {hist_fp} with {key=}")
                             if hist_fp != fp:
                                 # Copy the entire cache from historical entry
                                 # to today if necessary
                                 _write_dict_to_file(str(fp), cache)
+                            timer.lap('write')
+                            timer.finish(hit=True)
                             return cache[key]
 
                 # Else run the function and store cached result
                 result = await func(*args, **kwargs)
+                timer.lap('func')
                 cache[key] = result
                 _write_dict_to_file(str(fp), cache)
+                timer.lap('write')
+                timer.finish(hit=False)
                 return result
-            return async_memoize_dec
+            wrapper = async_memoize_dec
+
+        def preload(stubs: Optional[List[str]] = None):
+            """
+            Merge the day-files for `stubs` into today's cache file, so that the
+            first calls after a stub rollover are cache hits. By default, merges
+            the dated cache files of this function that are no more than
+            `cache_lifetime_days` days old, so that expired entries stay expired.
+            """
+            if stubs is None:
+                hist_fps = _get_hist_fps(Path(cache_dir), fp_pattern, cache_lifetime_days)
+            else:
+                hist_fps = [Path(cache_dir) / f"{funcname}_{s}.{ext}" for s in stubs]
+            cache = dict()
+            # Merge from least to most recent so that newer entries win
+            for hist_fp in reversed(hist_fps):
+                if hist_fp.exists():
+                    cache.update(_read_cache(str(hist_fp)))
+            if fp.exists():
+                cache.update(_read_cache(str(fp)))
+            log_func(f"Preloaded {len(cache)} entries from {len(hist_fps)} files into {fp}")
+            _write_dict_to_file(str(fp), cache)
+            return cache
+
+        def _find_misses(arg_sets: Iterable[Tuple[Tuple, Dict]]):
+            """Return the merged cache and the (key, args, kwargs) of uncached calls."""
+            cache = dict()
+            for hist_fp in reversed(_get_hist_fps(Path(cache_dir), fp_pattern, cache_lifetime_days)):
+                cache.update(_read_cache(str(hist_fp)))
+            misses = dict()
+            for args, kwargs in arg_sets:
+                key = _make_key(func.__name__, args, kwargs)
+                if key not in cache:
+                    misses[key] = (args, kwargs)
+            return cache, misses
+
+        def _store_results(cache: Dict, results: Dict):
+            if fp.exists():
+                cache.update(_read_cache(str(fp)))
+            cache.update(results)
+            log_func(f"Warmed {len(results)} entries into {fp}")
+            _write_dict_to_file(str(fp), cache)
+
+        if use_process_pool or not _use_async(func, log_func):
+            def warm(arg_sets: Iterable[Tuple[Tuple, Dict]], max_workers: Optional[int] = None):
+                """
+                Precompute the uncached calls in `arg_sets`, an iterable of
+                `(args, kwargs)` pairs, in parallel and write them to today's
+                cache file in a single write.
+                """
+                cache, misses = _find_misses(arg_sets)
+                if use_process_pool:
+                    futures = {
+                        key: _get_process_pool().submit(
+                            _call_by_qualname, func.__module__, func.__qualname__, args, kwargs
+                        )
+                        for key, (args, kwargs) in misses.items()
+                    }
+                    results = {key: future.result() for key, future in futures.items()}
+                else:
+                    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                        futures = {
+                            key: executor.submit(func, *args, **kwargs)
+                            for key, (args, kwargs) in misses.items()
+                        }
+                        results = {key: future.result() for key, future in futures.items()}
+                _store_results(cache, results)
+        else:
+            async def warm(arg_sets: Iterable[Tuple[Tuple, Dict]]):
+                """
+                Precompute the uncached calls in `arg_sets`, an iterable of
+                `(args, kwargs)` pairs, concurrently and write them to today's
+                cache file in a single write.
+                """
+                cache, misses = _find_misses(arg_sets)
+                values = await asyncio.gather(*(
+                    func(*args, **kwargs) for args, kwargs in misses.values()
+                ))
+                _store_results(cache, dict(zip(misses.keys(), values)))
+
+        # Matches the part of a cache file name after the function name
+        suffix = rf"(?:\d{{8}}|{re.escape(stub)})\.{re.escape(ext)}"
+
+        def migrate(from_version: Optional[str] = None) -> int:
+            """
+            Rename cache files written by version `from_version` of this function
+            to the current version, keeping its cached results after a change that
+            does not affect them. By default, migrates unversioned cache files.
+            Day-files that the current version has already written are merged,
+            keeping the entries of the current version.
+            """
+            if not versioned:
+                raise Exception(f"Cannot migrate cache of unversioned function '{basename}'")
+            src = f"{basename}-{from_version}" if from_version else basename
+            return _rename_namespace(Path(cache_dir), src, funcname, suffix, log_func, _merge_cache_files)
+
+        def retain() -> int:
+            """Delete cache files written by other versions of this function."""
+            if not versioned:
+                raise Exception(f"Cannot retain cache of unversioned function '{basename}'")
+            return _delete_other_versions(Path(cache_dir), basename, version, suffix, log_func)
+
+        wrapper.version = version
+        wrapper.migrate = migrate
+        wrapper.retain = retain
+        wrapper.preload = preload
+        wrapper.warm = warm
+        return wrapper
     return add_memoize_dec
 
@@ -0,0 +1,140 @@
+import os
+import json
+import atexit
+import random
+import threading
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+
+# Wrapper stages, in the order they run. Stages other than 'func' are overhead
+# added by the cache layer.
+STAGES = ['make_key', 'get_hist_fps', 'read', 'func', 'write']
+
+_STATS: Dict[str, Dict] = dict()
+_STATS_LOCK = threading.Lock()
+
+
+class _CallTimer:
+    """Records the time spent in each stage of a single memoized call."""
+
+    def __init__(self, funcname: str):
+        self.funcname = funcname
+        self.times = dict.fromkeys(STAGES, 0.)
+        self.last = perf_counter()
+
+    def lap(self, stage: str):
+        """Attribute the time since the previous lap to `stage`."""
+        now = perf_counter()
+        self.times[stage] += now - self.last
+        self.last = now
+
+    def finish(self, hit: bool):
+        with _STATS_LOCK:
+            stats = _STATS.setdefault(self.funcname, {
+                'calls': 0, 'hits': 0, 'times': dict.fromkeys(STAGES, 0.),
+            })
+            stats['calls'] += 1
+            stats['hits'] += int(hit)
+            for stage, seconds in self.times.items():
+                stats['times'][stage] += seconds
+
+
+class _NullTimer:
+    """Stands in for `_CallTimer` on calls that are not sampled."""
+
+    def lap(self, stage: str):
+        pass
+
+    def finish(self, hit: bool):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _get_profile_rate(profile: Optional[float], log_func: Callable = print) -> float:
+    """
+    Return the sampling rate from `profile`, or from $MEMOIZE_PROFILE if unset.
+    The environment variable may also be a boolean such as `true` or `no`;
+    invalid values disable profiling rather than failing at import time.
+    """
+    if profile is not None:
+        return float(profile)
+    value = os.environ.get('MEMOIZE_PROFILE', '').strip().lower()
+    if value in ('', '0', 'false', 'no', 'off'):
+        return 0.
+    if value in ('true', 'yes', 'on'):
+        return 1.
+    try:
+        return float(value)
+    except ValueError:
+        log_func(f"WARNING: Ignoring invalid {value=} of MEMOIZE_PROFILE; profiling is disabled")
+        return 0.
+
+
+def _start_timer(funcname: str, rate: float):
+    """Return a timer for this call if it is sampled at `rate`, else a no-op timer."""
+    if rate > 0 and (rate >= 1 or random.random() < rate):
+        return _CallTimer(funcname)
+    return _NULL_TIMER
+
+
+def profile_stats() -> List[Dict]:
+    """
+    Return per-function profiling results, ranked by the ratio of mean cache
+    layer overhead per call to mean function execution time per cache miss.
+    A ratio above 1 means that a cache hit is slower than recomputing.
+    """
+    with _STATS_LOCK:
+        stats = {funcname: dict(s, times=dict(s['times'])) for funcname, s in _STATS.items()}
+    rows = list()
+    for funcname, s in stats.items():
+        misses = s['calls'] - s['hits']
+        overhead = sum(t for stage, t in s['times'].items() if stage != 'func')
+        mean_overhead = overhead / s['calls']
+        mean_func = s['times']['func'] / misses if misses else None
+        rows.append({
+            'func': funcname,
+            'calls': s['calls'],
+            'hits': s['hits'],
+            'mean_overhead_s': mean_overhead,
+            'mean_func_s': mean_func,
+            'overhead_ratio': mean_overhead / mean_func if mean_func else None,
+            'stages_s': s['times'],
+        })
+    # Functions without a measured miss cannot be ranked, so list them last
+    rows.sort(key=lambda r: (r['overhead_ratio'] is None, -(r['overhead_ratio'] or 0)))
+    return rows
+
+
+def profile_report(as_json: bool = False) -> str:
+    """Return profiling results as a text table, or as JSON if `as_json` is set."""
+    rows = profile_stats()
+    if as_json:
+        return json.dumps(rows, indent=2)
+    lines = [
+        f"{'function':<40} {'calls':>7} {'hits':>7} {'ratio':>8} "
+        + ' '.join(f"{stage + '_ms':>15}" for stage in STAGES)
+    ]
+    for row in rows:
+        ratio = f"{row['overhead_ratio']:.3f}" if row['overhead_ratio'] is not None else '-'
+        lines.append(
+            f"{row['func']:<40} {row['calls']:>7} {row['hits']:>7} {ratio:>8} "
+            + ' '.join(f"{row['stages_s'][stage] * 1000 / row['calls']:>15.3f}" for stage in STAGES)
+        )
+    return '\n'.join(lines)
+
+
+def dump_profile_report(fp: str):
+    """Write profiling results to `fp`, as JSON if `fp` ends with .json, else as text."""
+    with open(fp, 'w') as f:
+        f.write(profile_report(as_json=fp.endswith('.json')))
+
+
+def reset_profile_stats():
+    with _STATS_LOCK:
+        _STATS.clear()
+
+
+if os.environ.get('MEMOIZE_PROFILE_REPORT'):
+    atexit.register(dump_profile_report, os.environ['MEMOIZE_PROFILE_REPORT'])
@@ -0,0 +1,71 @@
+import os
+import re
+import uuid
+import shutil
+import tarfile
+from pathlib import Path
+from typing import List, Optional, Callable
+from .utils import _create_cache_dir
+
+
+def export_snapshot(
+    fp: str,
+    cache_dir: Optional[str] = '/tmp/memoize',
+    funcnames: Optional[List[str]] = None,
+    log_func: Callable = print,
+):
+    """
+    Write the cache files in `cache_dir` to a single gzipped tar archive at `fp`.
+    If `funcnames` is specified, only export cache files of those functions,
+    including cache files of every version of a versioned function.
+    """
+    re_funcnames = None
+    if funcnames:
+        # Matches {funcname}[-{version}]_{stub}.json written by `memoize` and
+        # {funcname}[-{version}]_{key}_{stub}.{ext} written by `memoize_df`
+        names = '|'.join(re.escape(name) for name in funcnames)
+        re_funcnames = re.compile(
+            rf"(?:{names})(?:-[0-9a-f]+)?_(?:[^_]+\.json|[0-9a-f]{{7}}_[^_]+\.(?:csv|parquet))"
+        )
+    count = 0
+    with tarfile.open(fp, 'w:gz') as tar:
+        for cache_fp in sorted(Path(cache_dir).iterdir()):
+            if not cache_fp.is_file():
+                continue
+            if re_funcnames and not re.fullmatch(re_funcnames, cache_fp.name):
+                continue
+            tar.add(str(cache_fp), arcname=cache_fp.name)
+            count += 1
+    log_func(f"Exported {count} cache files from {cache_dir} to {fp}")
+
+
+def import_snapshot(
+    fp: str,
+    cache_dir: Optional[str] = '/tmp/memoize',
+    overwrite: bool = False,
+    log_func: Callable = print,
+):
+    """
+    Extract cache files from the archive at `fp` written by `export_snapshot`
+    into `cache_dir`. Existing cache files are kept unless `overwrite` is set.
+    """
+    _create_cache_dir(cache_dir)
+    count = 0
+    with tarfile.open(fp, 'r:gz') as tar:
+        for member in tar:
+            # Only accept plain files at the top level of the archive. Cache
+            # files that share a blob are archived as hardlinks to each other.
+            if not (member.isfile() or member.islnk()) or os.path.basename(member.name) != member.name:
+                log_func(f"Skipping unexpected archive member {member.name}")
+                continue
+            target = Path(cache_dir) / member.name
+            if target.exists() and not overwrite:
+                continue
+            # Existing cache files may share an inode with a blob, so write to
+            # a temporary file and replace the target rather than writing in place
+            tmp_fp = Path(cache_dir) / f".{uuid.uuid4().hex}.tmp"
+            with tar.extractfile(member) as src, open(tmp_fp, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_fp, target)
+            count += 1
+    log_func(f"Imported {count} cache files from {fp} to {cache_dir}")
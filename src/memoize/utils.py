@@ -1,11 +1,20 @@
 import os
+import ast
 import json
 import re
+import atexit
+import inspect
+import importlib
+import textwrap
 from pathlib import Path
 from glob import glob
 import hashlib
 from datetime import date, datetime, timedelta
-from typing import List, Dict, Callable
+from typing import List, Dict, Callable, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+# Process pool shared by all functions decorated with `use_process_pool=True`
+_PROCESS_POOL: Optional[ProcessPoolExecutor] = None
 
 def _write_dict_to_file(fp: str, d: Dict):
     with open(fp, 'w') as f:
@@ -79,4 +88,128 @@ def _use_async(func, log_func: Callable = print) -> bool:
 		return asyncio.iscoroutinefunction(func)
 	except (ImportError, NameError):
 		log_func("asyncio not available; assuming synchronous function")
-	return False
\ No newline at end of file
+	return False
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Return the shared ProcessPoolExecutor, creating it on first use."""
+    global _PROCESS_POOL
+    if _PROCESS_POOL is None:
+        _PROCESS_POOL = ProcessPoolExecutor()
+        atexit.register(_shutdown_process_pool)
+    return _PROCESS_POOL
+
+
+def _shutdown_process_pool():
+    global _PROCESS_POOL
+    if _PROCESS_POOL is not None:
+        _PROCESS_POOL.shutdown(wait=True)
+        _PROCESS_POOL = None
+
+
+def _call_by_qualname(module: str, qualname: str, args: List, kwargs: Dict):
+    """
+    Look up the function `module.qualname` in the worker process and call the
+    undecorated original. Functions decorated in place cannot be pickled
+    directly, since their module attribute is the memoize wrapper.
+    """
+    obj = importlib.import_module(module)
+    for attr in qualname.split('.'):
+        obj = getattr(obj, attr)
+    return inspect.unwrap(obj)(*args, **kwargs)
+
+
+def _hash_code(hl, code):
+    """Update `hl` with the bytecode, constants and names of code object `code`."""
+    hl.update(code.co_code)
+    hl.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        # Nested functions are code objects, whose repr contains their address
+        if inspect.iscode(const):
+            _hash_code(hl, const)
+        else:
+            hl.update(repr(const).encode())
+
+
+def _source_without_decorators(f: Callable) -> str:
+    """
+    Return the source code of `f` as a dump of its AST, without decorators,
+    comments or formatting, so that editing memoize arguments does not change it.
+    """
+    tree = ast.parse(textwrap.dedent(inspect.getsource(f)))
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            node.decorator_list = []
+    return ast.dump(tree)
+
+
+def _func_version(func: Callable, depends_on: Optional[List[Callable]] = None, maxlen: int = 8) -> str:
+    """
+    Return SHA-256 hash of the source code of `func` and of each function in
+    `depends_on`. Falls back to the bytecode if the source is unavailable, and
+    to the qualified name for callables without bytecode such as builtins.
+    """
+    hl = hashlib.new('sha256')
+    for f in [func] + list(depends_on or []):
+        f = inspect.unwrap(f)
+        try:
+            hl.update(_source_without_decorators(f).encode())
+        except (OSError, TypeError, SyntaxError):
+            code = getattr(f, '__code__', None)
+            if code is not None:
+                _hash_code(hl, code)
+            else:
+                name = f"{getattr(f, '__module__', None)}.{getattr(f, '__qualname__', repr(f))}"
+                hl.update(name.encode())
+    return hl.hexdigest()[:maxlen]
+
+
+def _rename_namespace(
+    cache_dir: Path,
+    src: str,
+    dst: str,
+    suffix: str,
+    log_func: Callable = print,
+    merge: Optional[Callable[[Path, Path], None]] = None,
+) -> int:
+    """
+    Rename cache files named `{src}_{suffix}` to `{dst}_{suffix}`, where `suffix`
+    is a regex. If the target file already exists, `merge(fp, target)` merges
+    the source into it if specified; otherwise the target is kept as is.
+    Returns number of migrated files.
+    """
+    re_query = re.compile(rf"{re.escape(src)}_({suffix})")
+    count = 0
+    for fp in cache_dir.glob(f"{src}_*"):
+        match = re.fullmatch(re_query, fp.name)
+        if not match:
+            continue
+        target = cache_dir / f"{dst}_{match.groups()[0]}"
+        if not target.exists():
+            os.rename(fp, target)
+        elif merge is not None:
+            merge(fp, target)
+            fp.unlink()
+        else:
+            log_func(f"Not migrating {fp} since {target} already exists")
+            continue
+        count += 1
+    log_func(f"Migrated {count} cache files from {src} to {dst}")
+    return count
+
+
+def _delete_other_versions(cache_dir: Path, funcname: str, version: str, suffix: str, log_func: Callable = print) -> int:
+    """
+    Delete cache files named `{funcname}-{other_version}_{suffix}`, where
+    `suffix` is a regex. Returns number of deleted files.
+    """
+    re_query = re.compile(rf"{re.escape(funcname)}-([0-9a-f]+)_(?:{suffix})")
+    count = 0
+    for fp in cache_dir.glob(f"{funcname}-*_*"):
+        match = re.fullmatch(re_query, fp.name)
+        if not match or match.groups()[0] == version:
+            continue
+        fp.unlink()
+        count += 1
+    log_func(f"Deleted {count} cache files of other versions of function {funcname}")
+    return count
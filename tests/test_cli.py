@@ -0,0 +1,125 @@
+import os
+import json
+import sqlite3
+import pytest
+from pathlib import Path
+from datetime import date, timedelta
+import pandas as pd
+from memoize import memoize
+from memoize.dataframe import memoize_df
+from memoize.cli import main
+
+
+def add_one(x):
+    return x + 1
+
+
+def make_frame(foo: int):
+    return pd.DataFrame({"value": range(foo)})
+
+
+def test_report(temp_cache_dir, capsys):
+    wrapped = memoize(stub='20200101', cache_lifetime_days=None, cache_dir=temp_cache_dir)(add_one)
+    wrapped(1)
+    wrapped(2)
+    memoize_df(stub='20200101', cache_dir=temp_cache_dir)(make_frame)(3)
+    capsys.readouterr()
+
+    main(['--cache-dir', temp_cache_dir, 'report', '--json'])
+    rows = {row['func']: row for row in json.loads(capsys.readouterr().out)}
+    assert rows['add_one']['entries'] == 2
+    assert rows['make_frame']['entries'] == 1
+    assert rows['add_one']['oldest_days'] > 0
+
+
+def test_compact(temp_cache_dir):
+    memoize(stub='20200101', cache_dir=temp_cache_dir)(add_one)(1)
+    memoize(stub='20200102', cache_dir=temp_cache_dir)(add_one)(2)
+
+    main(['--cache-dir', temp_cache_dir, 'compact'])
+    assert os.listdir(temp_cache_dir) == ['add_one_20200101.json']
+    with open(os.path.join(temp_cache_dir, 'add_one_20200101.json')) as f:
+        assert sorted(json.load(f).values()) == [2, 3]
+
+
+def test_compact_keeps_expired_entries_expired(temp_cache_dir):
+    call_count = 0
+
+    def add_two(x):
+        nonlocal call_count
+        call_count += 1
+        return x + 2
+
+    old_stub = (date.today() - timedelta(days=30)).strftime('%Y%m%d')
+    memoize(stub=old_stub, cache_dir=temp_cache_dir)(add_two)(1)
+    wrapped = memoize(cache_dir=temp_cache_dir, cache_lifetime_days=7)(add_two)
+    wrapped(2)
+    assert call_count == 2
+
+    main(['--cache-dir', temp_cache_dir, 'compact'])
+    assert wrapped(1) == 3
+    assert call_count == 3
+
+    # Day-files past the lifetime are left for gc
+    memoize(stub=old_stub, cache_dir=temp_cache_dir)(add_two)(5)
+    main(['--cache-dir', temp_cache_dir, 'compact', '--lifetime', '7'])
+    assert len(os.listdir(temp_cache_dir)) == 2
+
+
+def test_convert(temp_cache_dir, tmp_path):
+    memoize(stub='20200101', cache_dir=temp_cache_dir)(add_one)(1)
+    memoize_df(stub='20200101', cache_dir=temp_cache_dir)(make_frame)(3)
+
+    db_fp = tmp_path / 'cache.db'
+    main(['--cache-dir', temp_cache_dir, 'convert', 'json', 'sqlite', '--output', str(db_fp)])
+    with sqlite3.connect(str(db_fp)) as con:
+        assert con.execute("SELECT func, stub, value FROM cache").fetchall() == [('add_one', '20200101', '2')]
+
+    main(['--cache-dir', temp_cache_dir, 'convert', 'csv', 'parquet'])
+    df_fps = [fp for fp in os.listdir(temp_cache_dir) if fp.startswith('make_frame_')]
+    assert len(df_fps) == 1 and df_fps[0].endswith('.parquet')
+    assert list(pd.read_parquet(os.path.join(temp_cache_dir, df_fps[0]))['value']) == [0, 1, 2]
+
+
+def test_gc(temp_cache_dir):
+    memoize(stub='20200101', cache_dir=temp_cache_dir)(add_one)(1)
+    memoize(cache_dir=temp_cache_dir)(add_one)(1)
+
+    main(['--cache-dir', temp_cache_dir, '--dry-run', 'gc', '--lifetime', '1'])
+    assert len(os.listdir(temp_cache_dir)) == 2
+    main(['--cache-dir', temp_cache_dir, 'gc', '--lifetime', '1'])
+    assert len(os.listdir(temp_cache_dir)) == 1
+
+
+@pytest.mark.parametrize('src,dst', [('csv', 'csv'), ('parquet', 'parquet'), ('json', 'csv'), ('csv', 'sqlite')])
+def test_convert_rejects_unsupported(src, dst, temp_cache_dir):
+    memoize_df(stub='20200101', cache_dir=temp_cache_dir, dedupe=True)(make_frame)(3)
+    cache_fps = sorted(os.listdir(temp_cache_dir))
+
+    with pytest.raises(SystemExit):
+        main(['--cache-dir', temp_cache_dir, 'convert', src, dst])
+    assert sorted(os.listdir(temp_cache_dir)) == cache_fps
+
+
+def test_convert_dedupe(temp_cache_dir):
+    memoize_df(stub='20200101', cache_dir=temp_cache_dir, dedupe=True)(make_frame)(3)
+    main(['--cache-dir', temp_cache_dir, 'convert', 'csv', 'parquet'])
+
+    # The blob is left untouched by the conversion
+    [blob_fp] = (Path(temp_cache_dir) / 'blobs').iterdir()
+    assert list(pd.read_csv(blob_fp)['value']) == [0, 1, 2]
+    [cache_fp] = Path(temp_cache_dir).glob('make_frame_*.parquet')
+    assert list(pd.read_parquet(cache_fp)['value']) == [0, 1, 2]
+
+
+def test_convert_keeps_source_on_failure(temp_cache_dir, monkeypatch):
+    memoize_df(stub='20200101', cache_dir=temp_cache_dir)(make_frame)(3)
+    cache_fps = sorted(os.listdir(temp_cache_dir))
+
+    def failing_to_feather(self, path):
+        raise ImportError("pyarrow is not installed")
+
+    monkeypatch.setattr(pd.DataFrame, 'to_feather', failing_to_feather)
+    with pytest.raises(ImportError):
+        main(['--cache-dir', temp_cache_dir, 'convert', 'csv', 'arrow'])
+    assert sorted(os.listdir(temp_cache_dir)) == cache_fps
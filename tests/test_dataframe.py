@@ -1,8 +1,12 @@
+import os
 import pytest
 import asyncio
 import pandas as pd
+from datetime import date, timedelta
+from pathlib import Path
 from pandas.testing import assert_frame_equal
-from memoize.dataframe import memoize_df
+from memoize import export_snapshot, import_snapshot
+from memoize.dataframe import memoize_df, sweep_blobs
 
 
 def example_func(foo: int):
@@ -118,3 +122,134 @@ async def test_memoize_async_with_example_func(temp_cache_dir):
     # Verify the cached result has the same data (allowing for column type differences from CSV)
     assert list(result1[result1.columns[0]]) == list(result4[result4.columns[0]])
     assert call_count == 3  # Not incremented
+
+
+@pytest.mark.parametrize('ext', ['csv', 'parquet'])
+def test_memoize_warm_and_preload(ext, temp_cache_dir):
+    call_count = 0
+
+    def counting_example_func(foo: int):
+        nonlocal call_count
+        call_count += 1
+        return pd.DataFrame(data=range(0, foo))
+
+    yesterday = (date.today() - timedelta(days=1)).strftime('%Y%m%d')
+    wrapped = memoize_df(stub=yesterday, ext=ext, cache_dir=temp_cache_dir)(counting_example_func)
+    wrapped.warm([((foo,), {}) for foo in range(1, 4)], max_workers=2)
+    assert call_count == 3
+
+    # Roll over to a new stub and preload yesterday's files
+    wrapped = memoize_df(ext=ext, cache_dir=temp_cache_dir, cache_lifetime_days=1)(counting_example_func)
+    wrapped.preload()
+    for foo in range(1, 4):
+        assert len(wrapped(foo)) == foo
+    assert call_count == 3
+
+
+def test_memoize_preload_respects_lifetime(temp_cache_dir):
+    memoize_df(stub='20200101', cache_dir=temp_cache_dir)(example_func)(3)
+    memoize_df(cache_dir=temp_cache_dir, cache_lifetime_days=7)(example_func).preload()
+    assert len(list(Path(temp_cache_dir).glob('example_func_*.csv'))) == 1
+
+
+@pytest.mark.parametrize('ext', ['csv', 'parquet'])
+def test_memoize_dedupe(ext, temp_cache_dir):
+    def constant_func(foo: int):
+        return pd.DataFrame({"value": [1, 2, 3]})
+
+    wrapped = memoize_df(ext=ext, cache_dir=temp_cache_dir, dedupe=True)(constant_func)
+    wrapped(1)
+    wrapped(2)
+    assert_frame_equal(wrapped(1), constant_func(1))
+
+    # Both cache files share a single blob
+    cache_fps = [fp for fp in Path(temp_cache_dir).glob(f"constant_func_*.{ext}")]
+    blob_fps = list((Path(temp_cache_dir) / 'blobs').iterdir())
+    assert len(cache_fps) == 2
+    assert len(blob_fps) == 1
+    assert blob_fps[0].stat().st_nlink == 3
+
+    # Blob is only reclaimed once no cache file references it
+    cache_fps[0].unlink()
+    assert sweep_blobs(temp_cache_dir) == 0
+    cache_fps[1].unlink()
+    # Recently written blobs may not be linked yet, so they are kept
+    assert sweep_blobs(temp_cache_dir) == 0
+    assert sweep_blobs(temp_cache_dir, grace_seconds=0) == 1
+
+
+def test_memoize_dedupe_rewrites_swept_blob(temp_cache_dir, monkeypatch):
+    """Test that a blob swept before it is linked is written again."""
+    link = os.link
+    swept = []
+
+    def sweeping_link(src, dst):
+        if not swept:
+            # Simulate a concurrent sweep between writing and linking the blob
+            os.unlink(src)
+            swept.append(src)
+            raise FileNotFoundError(src)
+        return link(src, dst)
+
+    monkeypatch.setattr(os, 'link', sweeping_link)
+    wrapped = memoize_df(ext='csv', cache_dir=temp_cache_dir, dedupe=True)(example_func)
+    wrapped(3)
+    assert swept
+    [cache_fp] = Path(temp_cache_dir).glob('example_func_*.csv')
+    assert cache_fp.stat().st_nlink == 2
+    assert len(wrapped(3)) == 3
+
+
+def test_memoize_dedupe_without_hardlinks(temp_cache_dir, monkeypatch):
+    """Test that the blob store is skipped if hardlinks are unsupported."""
+    def unsupported_link(src, dst):
+        raise PermissionError(src)
+
+    monkeypatch.setattr(os, 'link', unsupported_link)
+    wrapped = memoize_df(ext='csv', cache_dir=temp_cache_dir, dedupe=True)(example_func)
+    wrapped(3)
+    [cache_fp] = Path(temp_cache_dir).glob('example_func_*.csv')
+    assert cache_fp.stat().st_nlink == 1
+    assert len(wrapped(3)) == 3
+    # The unlinked blob is left to sweep_blobs
+    assert sweep_blobs(temp_cache_dir, grace_seconds=0) == 1
+
+
+def test_memoize_dedupe_warm_duplicate_args(temp_cache_dir):
+    """Test that concurrent calls for the same key never write through a shared blob."""
+    def constant_func(foo: int):
+        return pd.DataFrame({"value": [1, 2, 3]})
+
+    wrapped = memoize_df(ext='csv', cache_dir=temp_cache_dir, dedupe=True)(constant_func)
+    wrapped(0)
+    wrapped.warm([((1,), {})] * 8, max_workers=8)
+
+    cache_fps = list(Path(temp_cache_dir).glob('constant_func_*.csv'))
+    assert len(cache_fps) == 2
+    for cache_fp in cache_fps:
+        assert list(pd.read_csv(cache_fp)['value']) == [1, 2, 3]
+    assert [fp.name for fp in Path(temp_cache_dir).iterdir() if fp.name.startswith('.')] == []
+
+
+def test_import_snapshot_overwrite_keeps_shared_blob(temp_cache_dir, tmp_path):
+    def frame_func(foo: int):
+        return pd.DataFrame({"value": [1, 2, 3]})
+
+    wrapped = memoize_df(ext='csv', cache_dir=temp_cache_dir, dedupe=True)(frame_func)
+    wrapped(1)
+    wrapped(2)
+
+    # Snapshot a different result for the call with foo=1
+    other_cache_dir = tmp_path / 'other'
+    other_cache_dir.mkdir()
+    other_fp = other_cache_dir / [fp.name for fp in Path(temp_cache_dir).glob('frame_func_*.csv')][0]
+    pd.DataFrame({"value": [9, 9, 9]}).to_csv(other_fp, index=False)
+    snapshot_fp = str(tmp_path / 'snapshot.tar.gz')
+    export_snapshot(snapshot_fp, cache_dir=str(other_cache_dir))
+    import_snapshot(snapshot_fp, cache_dir=temp_cache_dir, overwrite=True)
+
+    # Only the imported cache file changes, not the blob or the other call
+    values = sorted(list(pd.read_csv(fp)['value']) for fp in Path(temp_cache_dir).glob('frame_func_*.csv'))
+    assert values == [[1, 2, 3], [9, 9, 9]]
+    blob_fp = next((Path(temp_cache_dir) / 'blobs').iterdir())
+    assert list(pd.read_csv(blob_fp)['value']) == [1, 2, 3]
@@ -1,6 +1,11 @@
 import os
 import json
-from memoize import memoize
+import pytest
+import importlib.util
+from datetime import date
+from memoize.utils import _func_version
+from concurrent.futures import Future
+from memoize import memoize, export_snapshot, import_snapshot
 
 
 def test_memoize_basic_caching(temp_cache_dir):
@@ -197,3 +202,221 @@ def test_memoize_with_multiple_args(temp_cache_dir):
 	result3 = wrapped(1, 2, 4)
 	assert result3 == 7
 	assert call_count == 2  # Different args
+
+
+def cpu_bound_func(x):
+	return sum(i * i for i in range(x))
+
+
+def test_memoize_process_pool(temp_cache_dir):
+	"""Test that memoize dispatches misses to the process pool and returns futures."""
+	wrapped = memoize(cache_dir=temp_cache_dir, use_process_pool=True)(cpu_bound_func)
+
+	future1 = wrapped(1000)
+	assert isinstance(future1, Future)
+	assert future1.result() == cpu_bound_func(1000)
+
+	# Result is written to the cache before the future resolves
+	cache_file = os.listdir(temp_cache_dir)[0]
+	with open(os.path.join(temp_cache_dir, cache_file), 'r') as f:
+		assert list(json.load(f).values()) == [cpu_bound_func(1000)]
+
+	# Cache hit resolves immediately without touching the pool
+	future2 = wrapped(1000)
+	assert future2.done()
+	assert future2.result() == future1.result()
+
+
+def test_memoize_process_pool_rejects_local_func(temp_cache_dir):
+	"""Test that functions which cannot be imported by the workers are rejected."""
+	def local_func(x):
+		return x
+
+	with pytest.raises(Exception):
+		memoize(cache_dir=temp_cache_dir, use_process_pool=True)(local_func)
+
+
+def test_memoize_warm(temp_cache_dir):
+	"""Test that warm precomputes uncached calls so later calls are cache hits."""
+	call_count = 0
+
+	def square(x):
+		nonlocal call_count
+		call_count += 1
+		return x ** 2
+
+	wrapped = memoize(cache_dir=temp_cache_dir)(square)
+	wrapped(1)
+	wrapped.warm([((x,), {}) for x in range(4)], max_workers=2)
+	assert call_count == 4  # x=1 was already cached
+
+	assert [wrapped(x) for x in range(4)] == [0, 1, 4, 9]
+	assert call_count == 4
+
+
+def test_memoize_preload(temp_cache_dir):
+	"""Test that preload merges historical day-files into today's cache file."""
+	call_count = 0
+
+	def add_one(x):
+		nonlocal call_count
+		call_count += 1
+		return x + 1
+
+	memoize(stub='20200101', cache_dir=temp_cache_dir)(add_one)(1)
+	memoize(stub='20200102', cache_dir=temp_cache_dir)(add_one)(2)
+	assert call_count == 2
+
+	wrapped = memoize(stub='20300101', cache_dir=temp_cache_dir, cache_lifetime_days=None)(add_one)
+	cache = wrapped.preload()
+	assert sorted(cache.values()) == [2, 3]
+	assert wrapped(1) == 2
+	assert wrapped(2) == 3
+	assert call_count == 2
+
+
+def test_memoize_preload_respects_lifetime(temp_cache_dir):
+	"""Test that preload does not bring back entries past the cache lifetime."""
+	def add_two(x):
+		return x + 2
+
+	memoize(stub='20200101', cache_dir=temp_cache_dir)(add_two)(1)
+	wrapped = memoize(cache_dir=temp_cache_dir, cache_lifetime_days=7)(add_two)
+	assert wrapped.preload() == {}
+
+	# Explicit stubs are preloaded regardless of their age
+	assert list(wrapped.preload(stubs=['20200101']).values()) == [3]
+
+
+def test_snapshot_roundtrip(temp_cache_dir, tmp_path):
+	"""Test that a cache snapshot can be exported and imported on another host."""
+	def triple(x):
+		return x * 3
+
+	memoize(cache_dir=temp_cache_dir)(triple)(5)
+	snapshot_fp = str(tmp_path / 'snapshot.tar.gz')
+	export_snapshot(snapshot_fp, cache_dir=temp_cache_dir)
+
+	other_cache_dir = str(tmp_path / 'other')
+	import_snapshot(snapshot_fp, cache_dir=other_cache_dir)
+	assert os.listdir(other_cache_dir) == os.listdir(temp_cache_dir)
+
+	def triple_uncalled(x):
+		raise AssertionError("should be a cache hit")
+	triple_uncalled.__name__ = 'triple'
+	assert memoize(cache_dir=other_cache_dir)(triple_uncalled)(5) == 15
+
+
+def test_memoize_versioned(temp_cache_dir):
+	"""Test that changing the source of a versioned function invalidates its cache."""
+	def versioned_func(x):
+		return x + 1
+
+	def changed_func(x):
+		return x + 2
+	changed_func.__name__ = 'versioned_func'
+
+	wrapped1 = memoize(cache_dir=temp_cache_dir, versioned=True)(versioned_func)
+	wrapped2 = memoize(cache_dir=temp_cache_dir, versioned=True)(changed_func)
+	assert wrapped1.version != wrapped2.version
+	assert wrapped1(1) == 2
+	assert wrapped2(1) == 3
+
+	# Same source yields the same version and reuses the cache
+	wrapped3 = memoize(cache_dir=temp_cache_dir, versioned=True)(versioned_func)
+	assert wrapped3.version == wrapped1.version
+	assert len(os.listdir(temp_cache_dir)) == 2
+
+	# Only keep cache files of the current version
+	assert wrapped2.retain() == 1
+	assert os.listdir(temp_cache_dir) == [f"versioned_func-{wrapped2.version}_{date.today():%Y%m%d}.json"]
+
+
+def test_memoize_versioned_migrate(temp_cache_dir):
+	"""Test that migrate adopts cache files written before versioning was enabled."""
+	call_count = 0
+
+	def migrated_func(x):
+		nonlocal call_count
+		call_count += 1
+		return x * 2
+
+	memoize(cache_dir=temp_cache_dir)(migrated_func)(4)
+	wrapped = memoize(cache_dir=temp_cache_dir, versioned=True)(migrated_func)
+	assert wrapped.migrate() == 1
+	assert wrapped(4) == 8
+	assert call_count == 1
+
+
+def test_func_version_ignores_decorators(tmp_path):
+	"""Test that changing only the memoize arguments keeps the version."""
+	versions = list()
+	decorators = [
+		f"@memoize(cache_dir={str(tmp_path)!r}, cache_lifetime_days=0)",
+		f"@memoize(cache_dir={str(tmp_path)!r}, cache_lifetime_days=7, log_func=print)",
+	]
+	for i, decorator in enumerate(decorators):
+		module_fp = tmp_path / f"decorated_module_{i}.py"
+		module_fp.write_text(f"from memoize import memoize\n\n{decorator}\ndef decorated(x):\n    return x\n")
+		spec = importlib.util.spec_from_file_location(module_fp.stem, module_fp)
+		module = importlib.util.module_from_spec(spec)
+		spec.loader.exec_module(module)
+		versions.append(_func_version(module.decorated))
+	assert versions[0] == versions[1]
+
+
+def add_one_twice(x):
+	return x + 2
+
+
+def test_func_version_without_source():
+	"""Test versions of functions without source code and of builtins."""
+	namespace = dict()
+	exec("def calls_foo(x):\n    return foo(x)\n", namespace)
+	exec("def calls_bar(x):\n    return bar(x)\n", namespace)
+	assert _func_version(namespace['calls_foo']) != _func_version(namespace['calls_bar'])
+
+	assert _func_version(add_one_twice, depends_on=[len]) != _func_version(add_one_twice, depends_on=[abs])
+
+
+def test_memoize_versioned_migrate_merges(temp_cache_dir):
+	"""Test that migrate merges into a day-file the current version already wrote."""
+	call_count = 0
+
+	def merged_func(x):
+		nonlocal call_count
+		call_count += 1
+		return x * 3
+
+	unversioned = memoize(cache_dir=temp_cache_dir)(merged_func)
+	unversioned(1)
+	unversioned(2)
+	wrapped = memoize(cache_dir=temp_cache_dir, versioned=True)(merged_func)
+	wrapped(3)
+	assert call_count == 3
+
+	assert wrapped.migrate() == 1
+	assert os.listdir(temp_cache_dir) == [f"merged_func-{wrapped.version}_{date.today():%Y%m%d}.json"]
+	assert [wrapped(x) for x in (1, 2, 3)] == [3, 6, 9]
+	assert call_count == 3
+
+
+def test_snapshot_funcnames(temp_cache_dir, tmp_path):
+	"""Test that the funcnames filter matches versioned files but not other functions."""
+	def foo(x):
+		return x
+
+	def foo_bar(x):
+		return x
+
+	memoize(cache_dir=temp_cache_dir)(foo)(1)
+	versioned = memoize(cache_dir=temp_cache_dir, versioned=True)(foo)
+	versioned(1)
+	memoize(cache_dir=temp_cache_dir)(foo_bar)(1)
+
+	snapshot_fp = str(tmp_path / 'snapshot.tar.gz')
+	export_snapshot(snapshot_fp, cache_dir=temp_cache_dir, funcnames=['foo'])
+	other_cache_dir = str(tmp_path / 'other')
+	import_snapshot(snapshot_fp, cache_dir=other_cache_dir)
+	stub = f"{date.today():%Y%m%d}"
+	assert sorted(os.listdir(other_cache_dir)) == [f"foo-{versioned.version}_{stub}.json", f"foo_{stub}.json"]
@@ -0,0 +1,73 @@
+import json
+import pytest
+from memoize import memoize
+from memoize.profiler import (
+	STAGES, profile_stats, profile_report, dump_profile_report, reset_profile_stats, _get_profile_rate,
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_profile_stats():
+	reset_profile_stats()
+	yield
+	reset_profile_stats()
+
+
+def test_profile_records_stages(temp_cache_dir):
+	"""Test that profiled calls record hits, misses and per-stage timings."""
+	def profiled_func(x):
+		return sum(range(x))
+
+	wrapped = memoize(cache_dir=temp_cache_dir, profile=1)(profiled_func)
+	wrapped(1000)
+	wrapped(1000)
+
+	[row] = profile_stats()
+	assert row['func'] == 'profiled_func'
+	assert row['calls'] == 2
+	assert row['hits'] == 1
+	assert set(row['stages_s']) == set(STAGES)
+	assert row['stages_s']['func'] > 0
+	assert row['overhead_ratio'] is not None
+
+
+def test_profile_disabled_by_default(temp_cache_dir, monkeypatch):
+	"""Test that calls are not profiled unless enabled."""
+	monkeypatch.delenv('MEMOIZE_PROFILE', raising=False)
+	memoize(cache_dir=temp_cache_dir)(lambda x: x)(1)
+	assert profile_stats() == []
+
+	monkeypatch.setenv('MEMOIZE_PROFILE', '1')
+	memoize(cache_dir=temp_cache_dir)(lambda x: x)(1)
+	assert len(profile_stats()) == 1
+
+
+def test_profile_report(temp_cache_dir, tmp_path):
+	"""Test that the report is written as text or JSON."""
+	def fast_func(x):
+		return x
+
+	memoize(cache_dir=temp_cache_dir, profile=1)(fast_func)(1)
+	assert 'fast_func' in profile_report()
+
+	json_fp = str(tmp_path / 'report.json')
+	dump_profile_report(json_fp)
+	with open(json_fp) as f:
+		assert json.load(f)[0]['func'] == 'fast_func'
+
+
+@pytest.mark.parametrize('value,rate', [('true', 1.), ('Yes', 1.), ('no', 0.), ('0.25', 0.25), ('', 0.)])
+def test_profile_env_values(value, rate, monkeypatch):
+	"""Test that $MEMOIZE_PROFILE accepts booleans and sampling rates."""
+	monkeypatch.setenv('MEMOIZE_PROFILE', value)
+	assert _get_profile_rate(None) == rate
+
+
+def test_profile_env_invalid(temp_cache_dir, monkeypatch):
+	"""Test that an invalid $MEMOIZE_PROFILE warns and disables profiling."""
+	monkeypatch.setenv('MEMOIZE_PROFILE', 'sometimes')
+	messages = list()
+	wrapped = memoize(cache_dir=temp_cache_dir, log_func=messages.append)(lambda x: x)
+	assert any('MEMOIZE_PROFILE' in message for message in messages)
+	wrapped(1)
+	assert profile_stats() == []